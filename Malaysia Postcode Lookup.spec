@@ -5,7 +5,8 @@ a = Analysis(
     ['app_qt.py'],
     pathex=[],
     binaries=[],
-    datas=[('data', 'data')],
+    # only the prebuilt index ships; run `python postcode_service.py build-index` first
+    datas=[('data/postcodes.index', 'data')],
     hiddenimports=[],
     hookspath=[],
     hooksconfig={},
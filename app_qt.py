@@ -1,7 +1,10 @@
+import os
 import sys
-import csv
-from datetime import datetime
-from PySide6.QtCore import Qt
+import time
+
+_T0 = time.perf_counter()  # before Qt is imported, so the import cost shows up in the startup report
+
+from PySide6.QtCore import Qt, QTimer
 from PySide6.QtGui import QFont
 from PySide6.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
@@ -9,9 +12,16 @@ from PySide6.QtWidgets import (
     QMessageBox, QStatusBar, QFrame, QFileDialog
 )
 
-from postcode_service import PostcodeService
+from postcode_service import INDEX_FILE, PostcodeService
+
+# PyInstaller unpacks bundled files under sys._MEIPASS; from source, use this folder
+FROZEN = hasattr(sys, "_MEIPASS")
+BASE_DIR = getattr(sys, "_MEIPASS", os.path.dirname(os.path.abspath(__file__)))
+DATA_PATH = os.path.join(BASE_DIR, "data")  # folder with all.json + state json files
+INDEX_PATH = os.path.join(DATA_PATH, INDEX_FILE)  # prebuilt at build time, preferred when up to date
 
-DATA_PATH = "data"  # folder with all.json + state json files
+# Set POSTCODE_STARTUP_TIMING=1 to print each startup phase to stderr
+STARTUP_TIMING = bool(os.environ.get("POSTCODE_STARTUP_TIMING"))
 
 
 # ---------- Premium minimal black/white theme ----------
@@ -121,20 +131,62 @@ def pretty_result(title: str, lines: list[str]) -> str:
 
 
 def now_stamp() -> str:
+    from datetime import datetime
     return datetime.now().strftime("%Y%m%d-%H%M%S")
 
 
+class StartupTimer:
+    """Records (phase, ms) since the previous mark, starting at module import."""
+
+    def __init__(self, t0: float):
+        self.last = t0
+        self.t0 = t0
+        self.phases: list[tuple[str, float]] = []
+
+    def mark(self, phase: str):
+        now = time.perf_counter()
+        self.phases.append((phase, (now - self.last) * 1000))
+        self.last = now
+
+    def total_ms(self) -> float:
+        return (self.last - self.t0) * 1000
+
+    def report(self) -> str:
+        lines = [f"{name:<14}{ms:8.1f} ms" for name, ms in self.phases]
+        lines.append(f"{'total':<14}{self.total_ms():8.1f} ms")
+        return "\n".join(lines)
+
+
+def load_service() -> PostcodeService:
+    if not os.path.isfile(INDEX_PATH):
+        return PostcodeService(DATA_PATH)
+
+    # From source the JSON may have been edited after the last build-index;
+    # bundles ship the index alone, so there is nothing to compare with
+    sources = None if FROZEN else DATA_PATH
+    try:
+        return PostcodeService.from_index(INDEX_PATH, sources=sources)
+    except Exception as e:
+        # Bundles ship only the index, so there is often no JSON to fall back to
+        has_json = os.path.isdir(DATA_PATH) and any(x.endswith(".json") for x in os.listdir(DATA_PATH))
+        if not has_json:
+            raise RuntimeError(f"Cannot load prebuilt index {INDEX_PATH}: {e}") from e
+        print(f"Prebuilt index unusable ({e}); loading JSON from {DATA_PATH}", file=sys.stderr)
+    return PostcodeService(DATA_PATH)
+
+
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, timer: StartupTimer | None = None):
         super().__init__()
         self.setWindowTitle("Malaysia Postcode Lookup")
         self.setMinimumSize(980, 600)
 
-        try:
-            self.service = PostcodeService(DATA_PATH)
-        except Exception as e:
-            QMessageBox.critical(self, "Data load error", f"Cannot load data from: {DATA_PATH}\n\n{e}")
-            raise
+        self.timer = timer or StartupTimer(time.perf_counter())
+        # loaded by _load_data once the window is on screen
+        self.service: PostcodeService | None = None
+
+        # tab index -> builder, run the first time that tab is opened
+        self._lazy_tabs: dict[int, tuple[QWidget, object]] = {}
 
         # recent chips
         self.recent_postcodes: list[str] = []
@@ -145,8 +197,26 @@ class MainWindow(QMainWindow):
         self.last_postcode_info: dict | None = None
         self.last_city_info: dict | None = None
 
+        # delivery_zones.ZoneMap, set once a rate card is loaded
+        self.zone_map = None
+
         self._build_ui()
-        self._status("Ready • Offline data loaded")
+        self._status("Loading data…")
+        self.timer.mark("build ui")
+
+    def _load_data(self):
+        try:
+            self.service = load_service()
+        except Exception as e:
+            QMessageBox.critical(self, "Data load error", f"Cannot load data from: {DATA_PATH}\n\n{e}")
+            QApplication.instance().exit(1)
+            return
+        self.timer.mark("load data")
+
+        self.tabs.setEnabled(True)
+        self._status(f"Ready • Offline data loaded • {self.timer.total_ms():.0f} ms")
+        if STARTUP_TIMING:
+            print(self.timer.report(), file=sys.stderr)
 
     def _status(self, msg: str):
         self.statusBar().showMessage(msg, 5000)
@@ -189,13 +259,31 @@ class MainWindow(QMainWindow):
 
         self.tabs = QTabWidget()
         self.tabs.addTab(self._tab_postcode(), "Postcode")
-        self.tabs.addTab(self._tab_city(), "City")
+        self._add_lazy_tab(self._tab_city, "City")
+        self._add_lazy_tab(self._tab_zone, "Zone")
+        self.tabs.currentChanged.connect(self._ensure_tab)
+        # enabled by _load_data, so nothing fires before the service exists
+        self.tabs.setEnabled(False)
         t.addWidget(self.tabs)
 
         main.addWidget(tabs_card, 1)
         self.setStatusBar(QStatusBar())
 
     # ---------------- Tabs ----------------
+    def _add_lazy_tab(self, builder, title: str):
+        holder = QWidget()
+        lay = QVBoxLayout(holder)
+        lay.setContentsMargins(0, 0, 0, 0)
+        idx = self.tabs.addTab(holder, title)
+        self._lazy_tabs[idx] = (holder, builder)
+
+    def _ensure_tab(self, index: int):
+        entry = self._lazy_tabs.pop(index, None)
+        if entry is None:
+            return
+        holder, builder = entry
+        holder.layout().addWidget(builder())
+
     def _tab_postcode(self):
         w = QWidget()
         layout = QVBoxLayout(w)
@@ -387,6 +475,75 @@ class MainWindow(QMainWindow):
         layout.addLayout(bottom, 1)
         return w
 
+    def _tab_zone(self):
+        w = QWidget()
+        layout = QVBoxLayout(w)
+        layout.setContentsMargins(8, 8, 8, 8)
+        layout.setSpacing(12)
+
+        # Input card
+        card = self._card()
+        c = QVBoxLayout(card)
+        c.setContentsMargins(16, 16, 16, 16)
+        c.setSpacing(10)
+
+        label = QLabel("Delivery zone")
+        label.setFont(QFont("Arial", 12, QFont.Bold))
+
+        hint = QLabel("Load a rate card, then enter one or more postcodes (comma or space separated)")
+        hint.setObjectName("muted")
+        hint.setFont(QFont("Arial", 10))
+
+        c.addWidget(label)
+        c.addWidget(hint)
+
+        row = QHBoxLayout()
+        row.setSpacing(10)
+
+        self.zone_input = QLineEdit()
+        self.zone_input.setPlaceholderText("Enter postcode(s)… (e.g., 40100, 88000)")
+        self.zone_input.setClearButtonEnabled(True)
+        self.zone_input.returnPressed.connect(self.on_lookup_zone)
+
+        btn_lookup = QPushButton("Lookup")
+        btn_lookup.setObjectName("primary")
+        btn_lookup.clicked.connect(self.on_lookup_zone)
+
+        btn_load = QPushButton("Load rate card…")
+        btn_load.clicked.connect(self.on_load_rate_card)
+
+        row.addWidget(self.zone_input, 2)
+        row.addWidget(btn_lookup)
+        row.addWidget(btn_load)
+
+        c.addLayout(row)
+
+        self.zone_card_label = QLabel("No rate card loaded")
+        self.zone_card_label.setObjectName("muted")
+        self.zone_card_label.setFont(QFont("Arial", 10))
+        c.addWidget(self.zone_card_label)
+
+        layout.addWidget(card)
+
+        # Output card
+        out_card = self._card()
+        o = QVBoxLayout(out_card)
+        o.setContentsMargins(16, 16, 16, 16)
+        o.setSpacing(8)
+
+        out_label = QLabel("Result")
+        out_label.setFont(QFont("Arial", 12, QFont.Bold))
+
+        self.zone_output = QTextEdit()
+        self.zone_output.setReadOnly(True)
+        self.zone_output.setPlaceholderText("Zones will appear here…")
+
+        o.addWidget(out_label)
+        o.addWidget(self.zone_output, 1)
+        layout.addWidget(out_card, 1)
+
+        return w
+
     # ---------------- Chips helpers ----------------
     def _push_recent(self, arr: list[str], value: str):
         value = (value or "").strip()
@@ -508,6 +665,7 @@ class MainWindow(QMainWindow):
         if not path:
             return
 
+        import csv
         try:
             with open(path, "w", newline="", encoding="utf-8") as f:
                 w = csv.writer(f)
@@ -597,6 +755,7 @@ class MainWindow(QMainWindow):
         if not path:
             return
 
+        import csv
         try:
             with open(path, "w", newline="", encoding="utf-8") as f:
                 w = csv.writer(f)
@@ -607,12 +766,69 @@ class MainWindow(QMainWindow):
         except Exception as e:
             QMessageBox.critical(self, "Export error", str(e))
 
+    # ---------------- Actions (Zone) ----------------
+    def on_load_rate_card(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Load rate card", "", "JSON Files (*.json)")
+        if not path:
+            return
+
+        from delivery_zones import ZoneMap
+        try:
+            zone_map = ZoneMap.load(self.service, path)
+        except (OSError, ValueError) as e:
+            QMessageBox.critical(self, "Rate card error", str(e))
+            return
+
+        self.zone_map = zone_map
+        rep = zone_map.report()
+        self.zone_card_label.setText(
+            f"{rep['rate_card']} • {len(rep['zones'])} zones • "
+            f"{rep['postcodes_zoned']}/{rep['postcodes_total']} postcodes covered"
+        )
+
+        lines = [f"Zones: {', '.join(rep['zones']) or '-'}"]
+        if rep["gaps"]:
+            lines += ["", f"Gaps ({len(rep['gaps'])}):", ", ".join(rep["gaps"])]
+        if rep["empty_ranges"]:
+            lines += ["", "Ranges matching no postcode:", *rep["empty_ranges"]]
+        if rep["unknown_states"]:
+            lines += ["", f"Unknown states in overrides: {', '.join(rep['unknown_states'])}"]
+        self.zone_output.setText(pretty_result("Rate card loaded", lines))
+        self._status("Rate card loaded.")
+
+    def on_lookup_zone(self):
+        if self.zone_map is None:
+            self._status("Load a rate card first.")
+            return
+
+        pcs = self.zone_input.text().replace(",", " ").split()
+        if not pcs:
+            self._status("Enter a postcode first.")
+            return
+
+        lines = []
+        for pc, zone in zip(pcs, self.zone_map.zones_for(pcs)):
+            if zone:
+                lines.append(f"{pc}: {zone}")
+            elif self.service.lookup_by_postcode(pc) is None:
+                lines.append(f"{pc}: not in dataset")
+            else:
+                lines.append(f"{pc}: no zone (gap in rate card)")
+        self.zone_output.setText(pretty_result("Delivery zones", lines))
+        self._status(f"{len(pcs)} postcode(s) zoned.")
+
 
 def main():
+    timer = StartupTimer(_T0)
+    timer.mark("import")
     app = QApplication(sys.argv)
     app.setStyleSheet(APP_STYLE)
-    win = MainWindow()
+    timer.mark("qt init")
+    win = MainWindow(timer)
     win.show()
+    timer.mark("show")
+    # load data on the first event loop turn so the window paints first
+    QTimer.singleShot(0, win._load_data)
     sys.exit(app.exec())
 
 
@@ -4,13 +4,13 @@ set -e
 pip install --upgrade pip
 pip install pyinstaller pyside6
 
+# Prebuild the lookup index so the app never parses JSON at launch
+python postcode_service.py build-index --data data --out data/postcodes.index
+
 pyinstaller \
-  --name "Malaysia Postcode Lookup" \
-  --windowed \
   --noconfirm \
   --clean \
-  --add-data "data/postcodes.json:data" \
-  app_qt.py
+  "Malaysia Postcode Lookup.spec"
 
 echo "✅ App built successfully!"
 echo "📦 Find it in: dist/Malaysia Postcode Lookup.app"
@@ -0,0 +1,263 @@
+"""
+Diff two postcode datasets and write versioned snapshots.
+
+    python dataset_diff.py data/ new_dump/ --report changes.json --snapshot
+
+Both sides are loaded through PostcodeService (so any format that
+_normalize_to_states understands works), flattened into sorted compact
+indexes and compared with merge joins.
+"""
+import argparse
+import hashlib
+import json
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+from postcode_service import SNAPSHOT_DIR, PostcodeService
+
+# (postcode, state, city)
+PostcodeRow = tuple[str, str, str]
+# (city key, state, city name, sorted postcodes)
+CityRow = tuple[str, str, str, tuple[str, ...]]
+
+
+# ---------------------------
+# Compact indexes
+# ---------------------------
+def postcode_rows(states: list[dict[str, Any]]) -> list[PostcodeRow]:
+    rows = set()
+    for st in states:
+        for city in st.get("cities", []):
+            for pc in city.get("postcodes", []) or []:
+                if pc:
+                    rows.add((pc, st.get("name", ""), city.get("name", "")))
+    return sorted(rows)
+
+
+def city_rows(states: list[dict[str, Any]]) -> list[CityRow]:
+    rows = set()
+    for st in states:
+        for city in st.get("cities", []):
+            name = city.get("name", "")
+            key = name.strip().lower()
+            if key:
+                pcs = tuple(sorted(set(city.get("postcodes", []) or [])))
+                rows.add((key, st.get("name", ""), name, pcs))
+    return sorted(rows)
+
+
+def _merge_join(left: list, right: list, key: Callable[[Any], Any]) -> Iterator[tuple[Any, list, list]]:
+    """Walk two lists sorted by `key`, yielding (key, left_group, right_group)."""
+    i = j = 0
+    while i < len(left) or j < len(right):
+        if j >= len(right) or (i < len(left) and key(left[i]) < key(right[j])):
+            k = key(left[i])
+        else:
+            k = key(right[j])
+
+        lg = []
+        while i < len(left) and key(left[i]) == k:
+            lg.append(left[i])
+            i += 1
+        rg = []
+        while j < len(right) and key(right[j]) == k:
+            rg.append(right[j])
+            j += 1
+        yield k, lg, rg
+
+
+# ---------------------------
+# Diff
+# ---------------------------
+def _loc(row: PostcodeRow) -> dict[str, str]:
+    return {"city": row[2], "state": row[1]}
+
+
+def _pair_by_overlap(old_only: list[CityRow], new_only: list[CityRow]) -> list[tuple[CityRow, CityRow]]:
+    """
+    Pairs same-named cities of different states, most shared postcodes first.
+    Paired rows are removed from both lists; rows sharing nothing stay.
+    """
+    candidates = []
+    for i, o in enumerate(old_only):
+        pcs = set(o[3])
+        for j, n in enumerate(new_only):
+            shared = len(pcs.intersection(n[3]))
+            if shared:
+                candidates.append((-shared, o[1], n[1], i, j))
+    candidates.sort()
+
+    pairs, used_old, used_new = [], set(), set()
+    for _, _, _, i, j in candidates:
+        if i not in used_old and j not in used_new:
+            used_old.add(i)
+            used_new.add(j)
+            pairs.append((old_only[i], new_only[j]))
+    old_only[:] = [r for i, r in enumerate(old_only) if i not in used_old]
+    new_only[:] = [r for j, r in enumerate(new_only) if j not in used_new]
+    return pairs
+
+
+def diff_states(old: list[dict[str, Any]], new: list[dict[str, Any]]) -> dict[str, Any]:
+    added, removed, moved = [], [], []
+    for pc, lg, rg in _merge_join(postcode_rows(old), postcode_rows(new), key=lambda r: r[0]):
+        if not lg:
+            added.extend({"postcode": pc, **_loc(r)} for r in rg)
+        elif not rg:
+            removed.extend({"postcode": pc, **_loc(r)} for r in lg)
+        elif [r[1:] for r in lg] != [r[1:] for r in rg]:
+            moved.append({
+                "postcode": pc,
+                "from": [_loc(r) for r in lg],
+                "to": [_loc(r) for r in rg],
+            })
+
+    # Cities are joined by name; a name that leaves one state and appears in
+    # another is a move when the two share postcodes, anything left over is
+    # an add/remove candidate.
+    cities_moved = []
+    gone: list[CityRow] = []
+    new_cities: list[CityRow] = []
+    for _, lg, rg in _merge_join(city_rows(old), city_rows(new), key=lambda r: r[0]):
+        new_states = {r[1] for r in rg}
+        old_states = {r[1] for r in lg}
+        old_only = [r for r in lg if r[1] not in new_states]
+        new_only = [r for r in rg if r[1] not in old_states]
+        for o, n in _pair_by_overlap(old_only, new_only):
+            cities_moved.append({"city": n[2], "from_state": o[1], "to_state": n[1]})
+        gone.extend(old_only)
+        new_cities.extend(new_only)
+
+    # Same state + identical postcode set under a different name is a rename
+    by_content: dict[tuple[str, tuple[str, ...]], list[CityRow]] = {}
+    for r in gone:
+        if r[3]:
+            by_content.setdefault((r[1], r[3]), []).append(r)
+    cities_renamed = []
+    cities_added = []
+    renamed_from: set[CityRow] = set()
+    for r in new_cities:
+        candidates = by_content.get((r[1], r[3]))
+        if candidates:
+            o = candidates.pop(0)
+            renamed_from.add(o)
+            cities_renamed.append({"from": o[2], "to": r[2], "state": r[1]})
+        else:
+            cities_added.append({"city": r[2], "state": r[1]})
+    cities_removed = [{"city": r[2], "state": r[1]} for r in gone if r not in renamed_from]
+
+    return {
+        "summary": {
+            "postcodes_added": len(added),
+            "postcodes_removed": len(removed),
+            "postcodes_moved": len(moved),
+            "cities_added": len(cities_added),
+            "cities_removed": len(cities_removed),
+            "cities_renamed": len(cities_renamed),
+            "cities_moved": len(cities_moved),
+        },
+        "postcodes_added": added,
+        "postcodes_removed": removed,
+        "postcodes_moved": moved,
+        "cities_added": cities_added,
+        "cities_removed": cities_removed,
+        "cities_renamed": cities_renamed,
+        "cities_moved": cities_moved,
+    }
+
+
+def diff_services(old: PostcodeService, new: PostcodeService) -> dict[str, Any]:
+    report = diff_states(old.states, new.states)
+    return {
+        "from": {"path": str(old.data_path), "version": old.version},
+        "to": {"path": str(new.data_path), "version": new.version},
+        **report,
+    }
+
+
+# ---------------------------
+# Snapshots
+# ---------------------------
+def snapshot_payload(states: list[dict[str, Any]]) -> dict[str, Any]:
+    # Format C, sorted so equal data always hashes the same
+    out = []
+    for st in sorted(states, key=lambda s: s.get("name", "").lower()):
+        cities = [
+            {"name": c.get("name", ""), "postcodes": list(c.get("postcodes", []) or [])}
+            for c in sorted(st.get("cities", []), key=lambda c: c.get("name", "").lower())
+        ]
+        out.append({"name": st.get("name", ""), "code": st.get("code", "") or "", "cities": cities})
+    return {"states": out}
+
+
+def write_snapshot(states: list[dict[str, Any]], data_path: str | Path) -> str:
+    """
+    Store `states` as data_path/snapshots/<YYYYMMDD>-<hash>.json and return
+    the version. Identical content reuses the existing snapshot.
+    """
+    payload = snapshot_payload(states)
+    body = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    digest = hashlib.sha256(body.encode("utf-8")).hexdigest()[:12]
+
+    snap_dir = Path(data_path) / SNAPSHOT_DIR
+    existing = sorted(snap_dir.glob(f"*-{digest}.json")) if snap_dir.is_dir() else []
+    if existing:
+        return existing[0].stem
+
+    snap_dir.mkdir(parents=True, exist_ok=True)
+    version = f"{datetime.now().strftime('%Y%m%d')}-{digest}"
+    payload["version"] = version
+    with open(snap_dir / f"{version}.json", "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=1)
+    return version
+
+
+def list_snapshots(data_path: str | Path) -> list[str]:
+    snap_dir = Path(data_path) / SNAPSHOT_DIR
+    if not snap_dir.is_dir():
+        return []
+    return sorted(x.stem for x in snap_dir.glob("*.json"))
+
+
+# ---------------------------
+# CLI
+# ---------------------------
+def format_report(report: dict[str, Any]) -> str:
+    lines = [f"{report['from']['path']} -> {report['to']['path']}"]
+    for k, v in report["summary"].items():
+        lines.append(f"  {k.replace('_', ' ')}: {v}")
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Diff two postcode datasets.")
+    ap.add_argument("old", help="current dataset (file or folder)")
+    ap.add_argument("new", help="incoming dataset (file or folder)")
+    ap.add_argument("--old-version", help="compare against this snapshot of OLD instead")
+    ap.add_argument("--report", help="write the full change report as JSON")
+    ap.add_argument("--snapshot", action="store_true",
+                    help="store NEW as a versioned snapshot under OLD/snapshots")
+    args = ap.parse_args(argv)
+
+    old = PostcodeService(args.old, version=args.old_version)
+    new = PostcodeService(args.new)
+    report = diff_services(old, new)
+
+    if args.snapshot:
+        snap_root = old.data_path.parent if old.data_path.is_file() else old.data_path
+        report["to"]["version"] = write_snapshot(new.states, snap_root)
+
+    print(format_report(report))
+    if report["to"]["version"]:
+        print(f"  snapshot: {report['to']['version']}")
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
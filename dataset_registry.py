@@ -0,0 +1,173 @@
+"""
+Several dataset variants served from one process.
+
+    registry = DatasetRegistry(memory_budget=64 * 1024 * 1024)
+    registry.register("official", "data")
+    registry.register("vendor", base="official", overrides="vendor_extra.json")
+    registry.register("acme", base="vendor", overrides="acme_overrides.json")
+
+    registry.get("acme").lookup_by_postcode("40100")
+
+Variants registered with `base` share that dataset's tables through
+PostcodeService.with_overrides, so each one only costs its delta. Datasets
+load on first get() and the least recently used ones are evicted once the
+estimated footprint passes `memory_budget`. A dataset other loaded
+variants are layered on is never evicted before them, so the budget can be
+exceeded when everything loaded is still in use.
+
+get() is thread-safe. A dataset is built outside the registry lock, so a
+slow first load only holds up callers waiting for that same dataset.
+"""
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any
+
+from postcode_service import OverlayIndex, PostcodeService
+
+
+def _table_bytes(table: Any) -> int:
+    """Rough footprint of an index dict: the dict, its keys and entry dicts."""
+    if isinstance(table, OverlayIndex):
+        return _table_bytes(table.delta) + sys.getsizeof(table.removed)
+    size = sys.getsizeof(table)
+    for k, v in table.items():
+        size += sys.getsizeof(k) + sys.getsizeof(v)
+        if isinstance(v, dict):
+            size += sum(sys.getsizeof(x) for x in v.values())
+    return size
+
+
+def service_bytes(service: PostcodeService) -> int:
+    """Estimated memory owned by `service` (for overlays, just the delta)."""
+    return _table_bytes(service.postcode_index) + _table_bytes(service.city_index)
+
+
+class DatasetRegistry:
+    def __init__(self, memory_budget: int = 256 * 1024 * 1024):
+        self.memory_budget = memory_budget
+        self._specs: dict[str, dict[str, Any]] = {}
+        # name -> (service, estimated bytes), least recently used first
+        self._loaded: OrderedDict[str, tuple[PostcodeService, int]] = OrderedDict()
+        # name -> future of a load in progress, shared by concurrent get()s
+        self._loading: dict[str, Future] = {}
+        self._lock = threading.RLock()
+
+    # ---------------------------
+    # Registration
+    # ---------------------------
+    def register(self, name: str, data_path: str | Path | None = None, *,
+                 version: str | None = None, index: str | Path | None = None,
+                 base: str | None = None, overrides: str | Path | None = None):
+        """
+        Either a full dataset (`data_path` [+ `version`] or a prebuilt `index`)
+        or a variant: `base` (another registered name) + `overrides` file.
+        """
+        if base is not None:
+            if overrides is None or data_path is not None or index is not None:
+                raise ValueError("A variant takes `base` and `overrides` only")
+            if base not in self._specs:
+                raise KeyError(f"Unknown base dataset: {base}")
+        elif (data_path is None) == (index is None):
+            raise ValueError("Pass exactly one of `data_path` or `index`")
+
+        with self._lock:
+            if name in self._specs:
+                raise ValueError(f"Dataset already registered: {name}")
+            self._specs[name] = {
+                "data_path": data_path,
+                "version": version,
+                "index": index,
+                "base": base,
+                "overrides": overrides,
+            }
+
+    def names(self) -> list[str]:
+        return list(self._specs)
+
+    # ---------------------------
+    # Access
+    # ---------------------------
+    def get(self, name: str) -> PostcodeService:
+        with self._lock:
+            if name in self._loaded:
+                self._loaded.move_to_end(name)
+                return self._loaded[name][0]
+
+            spec = self._specs.get(name)
+            if spec is None:
+                raise KeyError(f"Unknown dataset: {name}")
+
+            future = self._loading.get(name)
+            if future is None:
+                future = self._loading[name] = Future()
+                owner = True
+            else:
+                owner = False
+
+        if not owner:
+            return future.result()
+
+        try:
+            service = self._load(spec)
+            size = service_bytes(service)
+        except Exception as e:
+            with self._lock:
+                del self._loading[name]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            self._loaded[name] = (service, size)
+            del self._loading[name]
+            self._evict_to_budget(keep=name)
+        future.set_result(service)
+        return service
+
+    def _load(self, spec: dict[str, Any]) -> PostcodeService:
+        if spec["base"] is not None:
+            return self.get(spec["base"]).with_overrides(spec["overrides"])
+        if spec["index"] is not None:
+            return PostcodeService.from_index(spec["index"])
+        return PostcodeService(spec["data_path"], version=spec["version"])
+
+    def evict(self, name: str) -> bool:
+        """Drops a loaded dataset unless loaded variants still build on it."""
+        with self._lock:
+            if name not in self._loaded or self._dependents(name):
+                return False
+            service, _ = self._loaded.pop(name)
+            service.close()
+            return True
+
+    def loaded(self) -> list[str]:
+        """Loaded datasets, least recently used first."""
+        return list(self._loaded)
+
+    def memory_usage(self) -> int:
+        return sum(size for _, size in self._loaded.values())
+
+    # ---------------------------
+    # Eviction
+    # ---------------------------
+    def _dependents(self, name: str) -> list[str]:
+        # variants still loading count too: they are being layered on `name` right now
+        return [n for n in (*self._loaded, *self._loading) if self._specs[n]["base"] == name]
+
+    def _pinned(self, name: str) -> set[str]:
+        """`name` and every dataset it is layered on."""
+        out = set()
+        while name is not None:
+            out.add(name)
+            name = self._specs[name]["base"]
+        return out
+
+    def _evict_to_budget(self, keep: str):
+        pinned = self._pinned(keep)
+        while self.memory_usage() > self.memory_budget:
+            victim = next((n for n in self._loaded if n not in pinned and not self._dependents(n)), None)
+            if victim is None:
+                return
+            self.evict(victim)
@@ -0,0 +1,227 @@
+"""
+Delivery zones from a postcode-range rate card.
+
+    python delivery_zones.py rate_card.json [--data data] [POSTCODE ...]
+
+Rate card format (JSON):
+
+    {
+      "zones": [
+        {"name": "East Malaysia", "ranges": [["88000", "91309"], "93000-98859"]},
+        {"name": "Klang Valley", "ranges": ["40000-48300", "50000-60000"]}
+      ],
+      "state_overrides": {"Wp Labuan": "East Malaysia"},
+      "default": "Peninsular"
+    }
+
+A range is a [low, high] pair, "low-high" (an en dash works too) or a
+single postcode, inclusive.
+State overrides win over ranges; "default" (optional) covers the rest.
+Overlapping ranges are rejected; postcodes of the dataset that end up with
+no zone are reported as gaps.
+"""
+import argparse
+import bisect
+import json
+import sys
+from pathlib import Path
+from typing import Any, Iterable
+
+from postcode_service import PostcodeService
+
+
+_DASHES = str.maketrans({"\u2013": "-", "\u2014": "-"})  # en/em dash as typed in rate cards
+
+
+def _parse_range(raw: Any) -> tuple[int, int]:
+    if isinstance(raw, (list, tuple)) and len(raw) == 2:
+        lo, hi = raw
+    elif isinstance(raw, (str, int)) and not isinstance(raw, bool):
+        text = str(raw).translate(_DASHES)
+        lo, _, hi = text.partition("-")
+        hi = hi or lo
+    else:
+        raise ValueError(f"Bad postcode range: {raw!r}")
+
+    lo, hi = str(lo).strip(), str(hi).strip()
+    if not (lo.isdigit() and hi.isdigit()) or int(lo) > int(hi):
+        raise ValueError(f"Bad postcode range: {raw!r}")
+    return int(lo), int(hi)
+
+
+def _check_card(rate_card: Any):
+    """Raises ValueError unless the card has the shape documented above."""
+    if not isinstance(rate_card, dict):
+        raise ValueError("Rate card must be a JSON object")
+    zones = rate_card.get("zones")
+    if zones is not None and not isinstance(zones, list):
+        raise ValueError('"zones" must be a list')
+    for z in zones or []:
+        if not isinstance(z, dict):
+            raise ValueError(f"Zone entries must be objects, got {z!r}")
+        if not isinstance(z.get("name"), str) or not z["name"].strip():
+            raise ValueError(f"Every zone needs a name: {z!r}")
+        if z.get("ranges") is not None and not isinstance(z["ranges"], list):
+            raise ValueError(f'"ranges" of zone {z["name"]!r} must be a list')
+    overrides = rate_card.get("state_overrides")
+    if overrides is not None and (
+        not isinstance(overrides, dict) or not all(isinstance(v, str) for v in overrides.values())
+    ):
+        raise ValueError('"state_overrides" must map state names to zone names')
+    default = rate_card.get("default")
+    if default is not None and not isinstance(default, str):
+        raise ValueError('"default" must be a zone name')
+
+
+def _fmt(pc: int) -> str:
+    return f"{pc:05d}"
+
+
+class ZoneMap:
+    def __init__(self, service: PostcodeService, rate_card: dict[str, Any], name: str = ""):
+        self.service = service
+        self.name = name
+
+        _check_card(rate_card)
+
+        # Interval index: sorted, non-overlapping (lo, hi, zone)
+        intervals: list[tuple[int, int, str]] = []
+        for z in rate_card.get("zones") or []:
+            zone = z["name"].strip()
+            for raw in z.get("ranges") or []:
+                lo, hi = _parse_range(raw)
+                intervals.append((lo, hi, zone))
+        intervals.sort()
+
+        # Sweep in start order; every earlier interval still open overlaps this one
+        overlaps: list[tuple[str, str]] = []
+        open_: list[tuple[int, int, str]] = []
+        for b in intervals:
+            open_ = [a for a in open_ if a[1] >= b[0]]
+            for a in open_:
+                overlaps.append((f"{_fmt(a[0])}-{_fmt(a[1])} {a[2]}", f"{_fmt(b[0])}-{_fmt(b[1])} {b[2]}"))
+            open_.append(b)
+        if overlaps:
+            lines = "\n".join(f"  {a}  <>  {b}" for a, b in overlaps)
+            raise ValueError(f"Overlapping ranges in rate card:\n{lines}")
+
+        self._starts = [lo for lo, _, _ in intervals]
+        self._intervals = intervals
+
+        known_states = {info["state"].lower() for info in service.postcode_index.values()}
+        self.state_overrides = {
+            str(k).strip().lower(): str(v).strip() for k, v in (rate_card.get("state_overrides") or {}).items()
+        }
+        self.unknown_states = sorted(k for k in self.state_overrides if k not in known_states)
+        self.default = (rate_card.get("default") or "").strip() or None
+
+        self.zones = sorted({zone for _, _, zone in intervals}
+                            | set(self.state_overrides.values())
+                            | ({self.default} if self.default else set()))
+
+        # Resolve every known postcode once; lookups are then a dict hit
+        self._by_postcode: dict[str, str] = {}
+        used = set()
+        uncovered: list[int] = []
+        for pc, info in service.postcode_index.items():
+            zone = self.state_overrides.get(info["state"].lower())
+            if zone is None:
+                i = self._interval_at(pc)
+                if i is not None:
+                    used.add(i)
+                    zone = intervals[i][2]
+                else:
+                    zone = self.default
+            if zone is None:
+                if pc.isdigit():
+                    uncovered.append(int(pc))
+                continue
+            self._by_postcode[pc] = zone
+
+        self.gaps = self._runs(sorted(uncovered))
+        self.empty_ranges = [f"{_fmt(lo)}-{_fmt(hi)} {z}"
+                             for i, (lo, hi, z) in enumerate(intervals) if i not in used]
+
+    @classmethod
+    def load(cls, service: PostcodeService, path: str | Path) -> "ZoneMap":
+        path = Path(path)
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(service, json.load(f), name=path.name)
+
+    # ---------------------------
+    # Index helpers
+    # ---------------------------
+    def _interval_at(self, postcode: str) -> int | None:
+        if not postcode.isdigit():
+            return None
+        n = int(postcode)
+        i = bisect.bisect_right(self._starts, n) - 1
+        if i >= 0 and n <= self._intervals[i][1]:
+            return i
+        return None
+
+    def _runs(self, codes: list[int]) -> list[str]:
+        """Collapses postcodes into runs of consecutive *dataset* postcodes."""
+        if not codes:
+            return []
+        table = sorted(int(pc) for pc in self.service.postcode_index if pc.isdigit())
+        pos = {pc: i for i, pc in enumerate(table)}
+        runs = []
+        first = prev = codes[0]
+        for pc in codes[1:]:
+            if pos[pc] != pos[prev] + 1:
+                runs.append((first, prev))
+                first = pc
+            prev = pc
+        runs.append((first, prev))
+        return [_fmt(a) if a == b else f"{_fmt(a)}-{_fmt(b)}" for a, b in runs]
+
+    # ---------------------------
+    # Public API
+    # ---------------------------
+    def zone_for(self, postcode: str) -> str | None:
+        """Zone of a postcode in the dataset, None if unknown or uncovered."""
+        return self._by_postcode.get(str(postcode).strip())
+
+    def zones_for(self, postcodes: Iterable[str]) -> list[str | None]:
+        get = self._by_postcode.get
+        return [get(str(pc).strip()) for pc in postcodes]
+
+    def report(self) -> dict[str, Any]:
+        return {
+            "rate_card": self.name,
+            "zones": self.zones,
+            "postcodes_zoned": len(self._by_postcode),
+            "postcodes_total": len(self.service.postcode_index),
+            "gaps": self.gaps,
+            "empty_ranges": self.empty_ranges,
+            "unknown_states": self.unknown_states,
+        }
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Check a rate card and look up delivery zones.")
+    ap.add_argument("rate_card")
+    ap.add_argument("postcodes", nargs="*")
+    ap.add_argument("--data", default="data", help="data folder or file (default: data)")
+    ap.add_argument("--version", help="pinned snapshot version")
+    # intermixed so postcodes may follow --data as in the usage above
+    args = ap.parse_intermixed_args(argv)
+
+    service = PostcodeService(args.data, version=args.version)
+    try:
+        zones = ZoneMap.load(service, args.rate_card)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    if args.postcodes:
+        for pc, zone in zip(args.postcodes, zones.zones_for(args.postcodes)):
+            print(f"{pc}\t{zone or '-'}")
+    else:
+        print(json.dumps(zones.report(), indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,317 @@
+"""
+Binary batch lookups over a Unix domain socket, for callers on the same host.
+
+    python postcode_server.py --socket /tmp/postcode.sock [--data data | --index data/postcodes.index]
+    python postcode_server.py --socket /tmp/postcode.sock --bench 10000
+
+Every frame is a 9 byte header <type:u8><request_id:u32><length:u32> plus
+`length` payload bytes, all little-endian.
+
+- DICT   (server -> client, once per connection, request_id 0):
+         <n_states:u16><n_cities:u16> then the state names followed by the city
+         names, UTF-8, separated by "\\n". Ids below index these lists.
+- BATCH  (client -> server): postcodes as u32 integers (01000 -> 1000).
+- RESULT (server -> client, same request_id): one packed
+         <valid:u8><city_id:u16><state_id:u8> record per postcode, in order.
+- ERROR  (server -> client, same request_id): UTF-8 message.
+
+Clients may send many BATCH frames without waiting; answers come back in
+request order on that connection. Connections are served concurrently.
+
+With numpy installed the id -> record gather is vectorized; without it a
+pure-Python gather is used, which is several times slower on large batches.
+"""
+import argparse
+import array
+import asyncio
+import operator
+import os
+import socket
+import stat
+import struct
+import sys
+import time
+from pathlib import Path
+
+from postcode_service import PostcodeService
+
+try:
+    import numpy as np
+except ImportError:  # optional accelerator, see module docstring
+    np = None
+
+HEADER = struct.Struct("<BII")
+RECORD = struct.Struct("<BHB")
+COUNTS = struct.Struct("<HH")
+
+FRAME_DICT = 0
+FRAME_BATCH = 1
+FRAME_RESULT = 2
+FRAME_ERROR = 3
+
+# Any id below 2**17 passes the range check in answer(), so the table covers all of them
+TABLE_SIZE = 1 << 17
+MAX_PAYLOAD = 16 * 1024 * 1024  # 4M postcodes per batch
+WRITE_HIGH_WATER = 1024 * 1024
+
+
+def postcode_id(postcode: str | int) -> int:
+    """Wire id for a postcode; anything that is not a 5 digit code maps to 0 (never valid)."""
+    pc = str(postcode).strip()
+    if len(pc) == 5 and pc.isdigit():
+        return int(pc)
+    return 0
+
+
+class BatchTable:
+    """Dense id -> packed record table built from a PostcodeService."""
+
+    def __init__(self, service: PostcodeService):
+        states: dict[str, int] = {}
+        cities: dict[str, int] = {}
+        table = [0] * TABLE_SIZE
+        for pc, info in service.postcode_index.items():
+            pid = postcode_id(pc)
+            if pid >= TABLE_SIZE:
+                continue  # not representable on the wire
+            state_id = states.setdefault(info["state"], len(states))
+            city_id = cities.setdefault(info["city"], len(cities))
+            table[pid] = 1 | (city_id << 8) | (state_id << 24)
+
+        if len(states) > 0xFF or len(cities) > 0xFFFF:
+            raise ValueError("Too many states/cities for the batch protocol")
+
+        self.states = list(states)
+        self.cities = list(cities)
+        self.table = table
+        self._np_table = np.array(table, dtype="<u4") if np is not None else None
+        names = "\n".join(self.states + self.cities).encode("utf-8")
+        self.dictionary = COUNTS.pack(len(self.states), len(self.cities)) + names
+
+    def answer(self, payload: bytes) -> bytes:
+        n, rem = divmod(len(payload), 4)
+        if rem:
+            raise ValueError("BATCH payload must be a whole number of u32 postcodes")
+        if n == 0:
+            return b""
+
+        if self._np_table is not None:
+            ids = np.frombuffer(payload, dtype="<u4")
+            if ids.max() >= TABLE_SIZE:
+                ids = np.where(ids < TABLE_SIZE, ids, 0)  # id 0 is never valid
+            return self._np_table[ids].tobytes()
+
+        ids = array.array("I", payload)
+        if sys.byteorder == "big":
+            ids.byteswap()
+        # ids < 2**17 <=> top byte is 0 and third byte is 0 or 1 (checked at C speed)
+        if payload[3::4].count(0) != n or payload[2::4].translate(None, b"\x00\x01"):
+            out = array.array("I", [self.table[i] if i < TABLE_SIZE else 0 for i in ids])
+        elif n == 1:
+            out = array.array("I", [self.table[ids[0]]])
+        else:
+            out = array.array("I", operator.itemgetter(*ids)(self.table))
+        if sys.byteorder == "big":
+            out.byteswap()
+        return out.tobytes()
+
+
+def frame(kind: int, request_id: int, payload: bytes) -> bytes:
+    return HEADER.pack(kind, request_id, len(payload)) + payload
+
+
+# ---------------------------
+# Server
+# ---------------------------
+class BatchServer:
+    def __init__(self, service: PostcodeService, socket_path: str | Path):
+        self.socket_path = str(socket_path)
+        self.table = BatchTable(service)
+        self._dict_frame = frame(FRAME_DICT, 0, self.table.dictionary)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        writer.write(self._dict_frame)
+        try:
+            while True:
+                try:
+                    kind, rid, length = HEADER.unpack(await reader.readexactly(HEADER.size))
+                except asyncio.IncompleteReadError:
+                    break  # client closed
+                if length > MAX_PAYLOAD:
+                    writer.write(frame(FRAME_ERROR, rid, b"payload too large"))
+                    break
+                payload = await reader.readexactly(length)
+
+                if kind != FRAME_BATCH:
+                    writer.write(frame(FRAME_ERROR, rid, b"unexpected frame type"))
+                    continue
+                try:
+                    writer.write(frame(FRAME_RESULT, rid, self.table.answer(payload)))
+                except ValueError as e:
+                    writer.write(frame(FRAME_ERROR, rid, str(e).encode("utf-8")))
+
+                # only wait on the socket when the client stops reading
+                if writer.transport.get_write_buffer_size() > WRITE_HIGH_WATER:
+                    await writer.drain()
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def _clear_stale_socket(self):
+        """Removes a socket left by a dead server; refuses anything else."""
+        try:
+            st = os.lstat(self.socket_path)
+        except FileNotFoundError:
+            return
+        if not stat.S_ISSOCK(st.st_mode):
+            raise FileExistsError(f"Not a socket, refusing to replace: {self.socket_path}")
+
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(self.socket_path)
+        except (ConnectionRefusedError, FileNotFoundError):
+            os.unlink(self.socket_path)
+            return
+        finally:
+            probe.close()
+        raise FileExistsError(f"A server is already listening on: {self.socket_path}")
+
+    async def serve_forever(self):
+        self._clear_stale_socket()
+        server = await asyncio.start_unix_server(self.handle, path=self.socket_path)
+        ours = os.lstat(self.socket_path).st_ino
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            # only remove the socket we created, not one that replaced it
+            try:
+                if os.lstat(self.socket_path).st_ino == ours:
+                    os.unlink(self.socket_path)
+            except FileNotFoundError:
+                pass
+
+
+# ---------------------------
+# Client
+# ---------------------------
+class BatchClient:
+    """
+    Blocking client; send() and recv() can be used separately to pipeline.
+    Keep the number of unanswered batches bounded: the server stops reading
+    a connection while its replies are not being read.
+    """
+
+    def __init__(self, socket_path: str | Path):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(str(socket_path))
+        self._rfile = self.sock.makefile("rb")
+        self._next_id = 1
+
+        kind, _, payload = self._read_frame()
+        if kind != FRAME_DICT:
+            raise ConnectionError("Expected dictionary frame from server")
+        n_states, n_cities = COUNTS.unpack_from(payload)
+        names = payload[COUNTS.size:].decode("utf-8").split("\n") if n_states + n_cities else []
+        self.states = names[:n_states]
+        self.cities = names[n_states:n_states + n_cities]
+
+    def close(self):
+        self._rfile.close()
+        self.sock.close()
+
+    def _read_exact(self, n: int) -> bytes:
+        data = self._rfile.read(n)
+        if len(data) < n:
+            raise ConnectionError("Server closed the connection")
+        return data
+
+    def _read_frame(self) -> tuple[int, int, bytes]:
+        kind, rid, length = HEADER.unpack(self._read_exact(HEADER.size))
+        return kind, rid, self._read_exact(length)
+
+    def send(self, ids: array.array) -> int:
+        rid = self._next_id
+        self._next_id = (self._next_id + 1) & 0xFFFFFFFF or 1
+        if sys.byteorder == "big":
+            ids = array.array("I", ids)
+            ids.byteswap()
+        self.sock.sendall(frame(FRAME_BATCH, rid, ids.tobytes()))
+        return rid
+
+    def recv(self) -> tuple[int, bytes]:
+        """Returns (request_id, packed records) of the next answer."""
+        kind, rid, payload = self._read_frame()
+        if kind == FRAME_ERROR:
+            raise ValueError(payload.decode("utf-8", "replace"))
+        return rid, payload
+
+    def lookup_raw(self, ids: array.array) -> bytes:
+        self.send(ids)
+        return self.recv()[1]
+
+    def lookup(self, postcodes: list[str]) -> list[tuple[bool, str | None, str | None]]:
+        """(valid, city, state) per postcode."""
+        ids = array.array("I", [postcode_id(pc) for pc in postcodes])
+        out = []
+        for valid, city_id, state_id in RECORD.iter_unpack(self.lookup_raw(ids)):
+            if valid:
+                out.append((True, self.cities[city_id], self.states[state_id]))
+            else:
+                out.append((False, None, None))
+        return out
+
+
+# ---------------------------
+# CLI
+# ---------------------------
+def bench(socket_path: str, batch: int, rounds: int = 200) -> float:
+    """Median round trip in microseconds for one batch of `batch` postcodes."""
+    client = BatchClient(socket_path)
+    try:
+        ids = array.array("I", (10000 + (i * 7919) % 90000 for i in range(batch)))
+        timings = []
+        for _ in range(rounds):
+            t0 = time.perf_counter()
+            client.lookup_raw(ids)
+            timings.append(time.perf_counter() - t0)
+        timings.sort()
+        return timings[len(timings) // 2] * 1e6
+    finally:
+        client.close()
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Serve postcode batches over a Unix socket.")
+    ap.add_argument("--socket", required=True, help="Unix socket path")
+    ap.add_argument("--data", default="data", help="data folder or file (default: data)")
+    ap.add_argument("--version", help="pinned snapshot version")
+    ap.add_argument("--index", help="prebuilt index to load instead of --data")
+    ap.add_argument("--bench", type=int, metavar="N",
+                    help="connect to a running server and time N-postcode batches")
+    args = ap.parse_args(argv)
+
+    if args.bench:
+        print(f"{args.bench} postcodes: median round trip {bench(args.socket, args.bench):.0f} us")
+        return 0
+
+    if args.index:
+        service = PostcodeService.from_index(args.index)
+    else:
+        service = PostcodeService(args.data, version=args.version)
+    server = BatchServer(service, args.socket)
+    print(f"Serving {len(server.table.cities)} cities on {args.socket}")
+    try:
+        asyncio.run(server.serve_forever())
+    except FileExistsError as e:
+        print(e, file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,135 @@
+import functools
 import json
+import operator
+import pickle
+import time
+from collections.abc import MutableMapping
+from itertools import chain, compress, filterfalse
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterator
+
+SNAPSHOT_DIR = "snapshots"  # versioned snapshots live in <data_path>/snapshots/<version>.json
+INDEX_FILE = "postcodes.index"  # prebuilt index written by `python postcode_service.py build-index`
+INDEX_FORMAT = 1
+SEARCH_CACHE_SIZE = 512  # search_cities results kept per service (the GUI searches on every keystroke)
+
+
+_MISSING = object()
+
+
+class OverlayIndex(MutableMapping):
+    """
+    Copy-on-write view over a shared base index. Writes and deletes land in
+    `delta` / `removed`; the base is never modified, so many overlays can
+    share one base and each only costs the size of its own changes.
+
+    An overlay of an overlay copies the parent's (small) delta and sits on
+    the same root dict, so lookups and scans never get deeper than one layer.
+    items()/values() return iterators rather than views.
+    """
+
+    def __init__(self, base: MutableMapping):
+        if isinstance(base, OverlayIndex):
+            self.delta: dict[str, Any] = dict(base.delta)
+            self.removed: set[str] = set(base.removed)
+            base = base.base
+        else:
+            self.delta = {}
+            self.removed = set()
+        self.base = base
+
+    def get(self, key, default=None):
+        v = self.delta.get(key, _MISSING)
+        if v is not _MISSING:
+            return v
+        if key in self.removed:
+            return default
+        return self.base.get(key, default)
+
+    def __getitem__(self, key):
+        v = self.get(key, _MISSING)
+        if v is _MISSING:
+            raise KeyError(key)
+        return v
+
+    def __contains__(self, key) -> bool:
+        return key in self.delta or (key not in self.removed and key in self.base)
+
+    def __setitem__(self, key, value):
+        self.delta[key] = value
+        self.removed.discard(key)
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self.delta.pop(key, None)
+        if key in self.base:
+            self.removed.add(key)
+
+    # Scans filter the base with C-level itertools instead of per-item
+    # Python checks, so search_cities over an overlay runs near base speed.
+    def _base_visible(self) -> Iterator[bool]:
+        hidden = self.removed.union(self.delta)
+        return map(operator.not_, map(hidden.__contains__, self.base))
+
+    def __iter__(self) -> Iterator[str]:
+        if not self.delta and not self.removed:
+            return iter(self.base)
+        hidden = self.removed.union(self.delta)
+        return chain(self.delta, filterfalse(hidden.__contains__, self.base))
+
+    def items(self):
+        if not self.delta and not self.removed:
+            return iter(self.base.items())
+        return chain(self.delta.items(), compress(self.base.items(), self._base_visible()))
+
+    def values(self):
+        if not self.delta and not self.removed:
+            return iter(self.base.values())
+        return chain(self.delta.values(), compress(self.base.values(), self._base_visible()))
+
+    def __len__(self) -> int:
+        shadowed = sum(1 for k in self.delta if k in self.base)
+        return len(self.base) - len(self.removed) + len(self.delta) - shadowed
+
+
+class _IndexUnpickler(pickle.Unpickler):
+    """
+    The index only holds dicts, lists and strings, none of which need a
+    global to rebuild. Refusing every global means a tampered index file
+    cannot import or call anything while it is loaded.
+    """
+
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError(f"Index files may not reference {module}.{name}")
+
+
+def _source_stamps(path: Path) -> dict[str, list[int]]:
+    """(mtime_ns, size) of the JSON files a service is loaded from, to spot a stale index."""
+    files = [path] if path.is_file() else sorted(x for x in path.glob("*.json") if x.is_file())
+    out = {}
+    for x in files:
+        st = x.stat()
+        out[x.name] = [st.st_mtime_ns, st.st_size]
+    return out
+
+
+def _traced(method, trace):
+    """Wraps a bound lookup so each call is timed and handed to `trace`."""
+    name = method.__name__
+    key_arg = method.__code__.co_varnames[1]  # first parameter after self
+    perf = time.perf_counter
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        t0 = perf()
+        out = method(*args, **kwargs)
+        key = args[0] if args else kwargs.get(key_arg, "")
+        trace.record(name, key, perf() - t0)
+        return out
+
+    return wrapper
+
 
 class PostcodeService:
     """
@@ -9,17 +138,211 @@ class PostcodeService:
       (matches your all.json structure) :contentReference[oaicite:2]{index=2}
     - per-state style: {"name":"Johor","city":[{"name":"...","postcode":[...]}]}
       (matches johor.json, kedah.json etc.) 
+
+    Pass `version` to pin a snapshot written by dataset_diff.py instead of
+    reading the live files: data_path/snapshots/<version>.json is loaded.
+    Pass `trace_path` to append anonymized query traces (see query_trace.py).
     """
 
-    def __init__(self, data_path: str | Path):
+    def __init__(self, data_path: str | Path, version: str | None = None,
+                 trace_path: str | Path | None = None):
         self.data_path = Path(data_path)
+        self.version = version
+        self._init_runtime(trace_path)
 
         # Indexes for instant UI response
         self.postcode_index: dict[str, dict[str, str]] = {}
         self.city_index: dict[str, dict[str, Any]] = {}
 
-        states = self._load_all_states(self.data_path)
-        self._build_indexes(states)
+        if version:
+            source = self._snapshot_path(self.data_path, version)
+        else:
+            source = self.data_path
+        self._sources = _source_stamps(source) if source.exists() else None
+
+        # Normalized states are kept for diffing / snapshotting
+        self.states = self._load_all_states(source)
+        self._build_indexes(self.states)
+
+    @classmethod
+    def from_index(cls, index_path: str | Path, trace_path: str | Path | None = None,
+                   sources: str | Path | None = None) -> "PostcodeService":
+        """
+        Load a prebuilt index (see build_index) without parsing any JSON.
+        Index files are meant to be build output; loading only accepts plain
+        containers, so a foreign file fails instead of running code.
+
+        Pass `sources` (the data folder or file the index was built from) to
+        raise ValueError when those JSON files changed since the build.
+        """
+        index_path = Path(index_path)
+        with open(index_path, "rb") as f:
+            payload = _IndexUnpickler(f).load()
+        if not isinstance(payload, dict) or payload.get("format") != INDEX_FORMAT:
+            raise ValueError(f"Unsupported index format in: {index_path}")
+        if sources is not None and payload.get("sources") != _source_stamps(Path(sources)):
+            raise ValueError(f"Index is older than the data in {sources}, rebuild it: {index_path}")
+
+        self = cls.__new__(cls)
+        self.data_path = index_path
+        self.version = payload["version"]
+        self._sources = payload.get("sources")
+        self._init_runtime(trace_path)
+        self.states = payload["states"]
+        self.postcode_index = payload["postcode_index"]
+        self.city_index = payload["city_index"]
+        return self
+
+    def _init_runtime(self, trace_path: str | Path | None):
+        self._search_cache: dict[str, list[str]] = {}
+        self._trace = None
+        if trace_path:
+            from query_trace import METHODS, TraceWriter
+            self._trace = TraceWriter(trace_path)
+            # only traced instances get wrappers; everyone else calls the plain methods
+            for name in METHODS:
+                setattr(self, name, _traced(getattr(self, name), self._trace))
+
+    def close(self):
+        """Flushes and stops the trace writer, if any."""
+        if self._trace is not None:
+            from query_trace import METHODS
+            for name in METHODS:
+                self.__dict__.pop(name, None)
+            self._trace.close()
+            self._trace = None
+
+    def warm_up(self, trace_path: str | Path, top: int = 200) -> int:
+        """
+        Replays the `top` most frequent keys of a previous trace so the search
+        cache is populated before real traffic arrives. Not traced itself.
+        """
+        from query_trace import hot_keys
+
+        keys = hot_keys(trace_path, self, top=top)
+        cls = type(self)
+        for method, key in keys:
+            getattr(cls, method)(self, key)  # the class methods, bypassing trace wrappers
+        return len(keys)
+
+    def with_overrides(self, overrides_path: str | Path) -> "PostcodeService":
+        """
+        New service sharing this one's tables with an override file layered on
+        top (see OverlayIndex). The file may be in any supported data format,
+        plus an optional {"remove": {"postcodes": [...], "cities": [...]}}.
+
+        An override city is merged into the base city with the same name in
+        the same state; postcodes it lists move to it. Removing a city also
+        removes its postcodes, except those another remaining city lists.
+        `states` is the merged view, sharing every state the overrides do not
+        touch.
+        """
+        overrides_path = Path(overrides_path)
+        data = self._read_json(overrides_path)
+
+        remove = (data.get("remove") or {}) if isinstance(data, dict) else {}
+        removed_cities = {str(c).strip().lower() for c in remove.get("cities") or []}
+        removed_pcs = {str(p).strip() for p in remove.get("postcodes") or []}
+
+        # state key -> (state, city key -> override postcodes)
+        pending: dict[str, tuple[dict[str, Any], dict[str, dict[str, Any]]]] = {}
+        for st in self._normalize_to_states(data, source_name=overrides_path.name):
+            _, cities = pending.setdefault(st["name"].lower(), (st, {}))
+            for c in st["cities"]:
+                ck = c["name"].lower()
+                if ck:
+                    entry = cities.setdefault(ck, {"name": c["name"], "postcodes": []})
+                    entry["postcodes"] += [p for p in c["postcodes"] if p and p not in removed_pcs]
+        claimed = {p for _, cities in pending.values() for c in cities.values() for p in c["postcodes"]}
+
+        states: list[dict[str, Any]] = []
+        # state key -> state holding only the cities to re-index
+        changed: dict[str, dict[str, Any]] = {}
+        gone: set[str] = set()  # postcodes of removed cities
+        for st in self.states:
+            _, ov = pending.pop(st["name"].lower(), (None, {}))
+            cities = []
+            touched = []
+            for c in st["cities"]:
+                ck = c["name"].lower()
+                if ck in removed_cities:
+                    gone.update(c["postcodes"])
+                    continue
+                extra = ov.pop(ck, None)
+                own = set(extra["postcodes"]) if extra else set()
+                pcs = [p for p in c["postcodes"] if p not in removed_pcs and (p not in claimed or p in own)]
+                if extra:
+                    seen = set(pcs)
+                    pcs += [p for p in extra["postcodes"] if p not in seen]
+                if extra or len(pcs) != len(c["postcodes"]):
+                    c = {"name": c["name"], "postcodes": pcs}
+                    touched.append(c)
+                cities.append(c)
+            for extra in ov.values():
+                cities.append(extra)
+                touched.append(extra)
+
+            if touched or len(cities) != len(st["cities"]):
+                st = {**st, "cities": cities}
+                changed[st["name"].lower()] = {**st, "cities": touched}
+            states.append(st)
+
+        for st, ov in pending.values():
+            new_state = {"name": st["name"], "code": st.get("code", "") or "", "cities": list(ov.values())}
+            states.append(new_state)
+            changed[new_state["name"].lower()] = new_state
+
+        # A removed city's postcode can also be listed by a city that stays
+        # (86400 is Batu Pahat and Parit Raja): re-index the last such city,
+        # as a full build would, so the postcode points at it.
+        keepers: dict[str, tuple[dict[str, Any], dict[str, Any]]] = {}
+        if gone:
+            for st in states:
+                for c in st["cities"]:
+                    for p in gone.intersection(c["postcodes"]):
+                        keepers[p] = (st, c)
+        for st, c in keepers.values():
+            stub = changed.setdefault(st["name"].lower(), {**st, "cities": []})
+            if not any(x is c for x in stub["cities"]):
+                stub["cities"].append(c)
+
+        other = self.__class__.__new__(self.__class__)
+        other.data_path = overrides_path
+        other.version = self.version
+        other._sources = None  # no single set of source files
+        other._init_runtime(None)
+        other.postcode_index = OverlayIndex(self.postcode_index)
+        other.city_index = OverlayIndex(self.city_index)
+        other.states = states
+
+        for ck in removed_cities:
+            other.city_index.pop(ck, None)
+        # postcodes no remaining city lists go with their city
+        for pc in gone.difference(keepers):
+            info = other.postcode_index.get(pc)
+            if info is not None and info["city"].lower() in removed_cities:
+                del other.postcode_index[pc]
+        for pc in removed_pcs:
+            other.postcode_index.pop(pc, None)
+
+        # only the touched cities (and their postcodes) land in the delta
+        other._build_indexes(list(changed.values()))
+        return other
+
+    def build_index(self, out_path: str | Path) -> Path:
+        out_path = Path(out_path)
+        payload = {
+            "format": INDEX_FORMAT,
+            "version": self.version,
+            "sources": self._sources,
+            "states": self.states,
+            # overlays are flattened so the index stays plain containers
+            "postcode_index": dict(self.postcode_index.items()),
+            "city_index": dict(self.city_index.items()),
+        }
+        with open(out_path, "wb") as f:
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        return out_path
 
     # ---------------------------
     # Loading + Normalization
@@ -57,6 +380,13 @@ class PostcodeService:
 
         return list(merged.values())
 
+    def _snapshot_path(self, p: Path, version: str) -> Path:
+        base = p.parent if p.is_file() else p
+        snap = base / SNAPSHOT_DIR / f"{version}.json"
+        if not snap.is_file():
+            raise FileNotFoundError(f"Snapshot not found: {snap}")
+        return snap
+
     def _read_json(self, path: Path) -> dict[str, Any]:
         with open(path, "r", encoding="utf-8") as f:
             return json.load(f)
@@ -166,10 +496,41 @@ class PostcodeService:
         q = str(query).strip().lower()
         if not q:
             return []
-        out = []
-        for k, v in self.city_index.items():
-            if q in k:
-                out.append(v["city"])
-                if len(out) >= limit:
-                    break
-        return out
+        # cache every match so one entry serves any limit; least recently used goes first
+        cache = self._search_cache
+        out = cache.pop(q, None)
+        if out is None:
+            index = self.city_index
+            if isinstance(index, OverlayIndex):
+                # match on the plain base dict; only matches pay the shadowing check
+                hidden = index.removed.union(index.delta)
+                out = [v["city"] for k, v in index.delta.items() if q in k]
+                out += [v["city"] for k, v in index.base.items() if q in k and k not in hidden]
+            else:
+                out = [v["city"] for k, v in index.items() if q in k]
+            if len(cache) >= SEARCH_CACHE_SIZE:
+                cache.pop(next(iter(cache)))
+        cache[q] = out  # (re)inserted at the end, so hits stay
+        return out[:limit]
+
+
+def main(argv: list[str] | None = None) -> int:
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Postcode data tools.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build-index", help="prebuild the lookup index for fast app launch")
+    b.add_argument("--data", default="data", help="data folder or file (default: data)")
+    b.add_argument("--version", help="build from this snapshot instead of the live files")
+    b.add_argument("--out", help=f"output file (default: <data>/{INDEX_FILE})")
+    args = ap.parse_args(argv)
+
+    service = PostcodeService(args.data, version=args.version)
+    out = Path(args.out) if args.out else Path(args.data) / INDEX_FILE
+    service.build_index(out)
+    print(f"Wrote {out} ({len(service.postcode_index)} postcodes, {len(service.city_index)} cities)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
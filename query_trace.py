@@ -0,0 +1,263 @@
+"""
+Anonymized query traces for PostcodeService.
+
+    python query_trace.py replay queries.trace --data data
+    python query_trace.py top queries.trace --data data
+
+A trace is an append-only binary log: an 8 byte header followed by fixed
+13 byte records (method id, 8 byte blake2b hash of the normalized key,
+latency in nanoseconds). Keys are never stored in clear; replay and
+warm-up map hashes back by hashing the keys the dataset itself knows
+(postcodes, city names and every substring of a city name for searches).
+A key that still does not resolve matched nothing in that dataset; replay
+runs it as a miss and reports it separately.
+"""
+import argparse
+import atexit
+import hashlib
+import queue
+import struct
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Iterator
+
+TRACE_MAGIC = b"PCTRACE1"
+RECORD = struct.Struct("<B8sI")
+METHODS = ("validate_postcode", "lookup_by_postcode", "lookup_by_city", "search_cities")
+METHOD_IDS = {m: i for i, m in enumerate(METHODS)}
+# methods whose keys are case-folded by PostcodeService
+_CASE_FOLDED = {"lookup_by_city", "search_cities"}
+
+_MAX_NS = 2**32 - 1  # ~4.3 s
+
+
+def key_hash(key: str) -> bytes:
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=8, person=b"pctrace").digest()
+
+
+def _normalize(method: str, key: Any) -> str:
+    k = str(key).strip()
+    return k.lower() if method in _CASE_FOLDED else k
+
+
+# ---------------------------
+# Writing
+# ---------------------------
+class TraceWriter:
+    """
+    Appends records from a background thread. record() only enqueues, so the
+    lookup path never waits on hashing or disk.
+    """
+
+    _STOP = object()
+
+    def __init__(self, path: str | Path, flush_every: int = 256):
+        self.path = Path(path)
+        self.flush_every = flush_every
+        # opened here so a bad path fails now, not silently in the thread
+        self._file = open(self.path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(TRACE_MAGIC)
+            self._file.flush()
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._alive = True
+        self._thread = threading.Thread(target=self._run, name="postcode-trace", daemon=True)
+        self._thread.start()
+        # the daemon thread would be killed mid-queue at exit otherwise
+        atexit.register(self.close)
+
+    def record(self, method: str, key: Any, seconds: float):
+        # once the writer is gone (closed or failed) records are dropped, not queued forever
+        if self._alive:
+            self._queue.put((method, key, seconds))
+
+    def close(self):
+        atexit.unregister(self.close)
+        self._alive = False
+        if self._thread.is_alive():
+            self._queue.put(self._STOP)
+            self._thread.join()
+
+    def _run(self):
+        try:
+            with self._file as f:
+                self._write_loop(f)
+        finally:
+            self._alive = False
+
+    def _write_loop(self, f):
+        pending = 0
+        while True:
+            item = self._queue.get()
+            if item is self._STOP:
+                break
+            # drain whatever else is queued before touching the file
+            batch = [item]
+            while True:
+                try:
+                    nxt = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is self._STOP:
+                    self._queue.put(nxt)
+                    break
+                batch.append(nxt)
+
+            for method, key, seconds in batch:
+                ns = min(int(seconds * 1e9), _MAX_NS)
+                f.write(RECORD.pack(METHOD_IDS[method], key_hash(_normalize(method, key)), ns))
+            pending += len(batch)
+            if pending >= self.flush_every or self._queue.empty():
+                f.flush()
+                pending = 0
+
+
+# ---------------------------
+# Reading
+# ---------------------------
+def read_trace(path: str | Path) -> Iterator[tuple[str, bytes, int]]:
+    """Yields (method, key hash, latency_ns). A torn trailing record is ignored."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(TRACE_MAGIC):
+        raise ValueError(f"Not a query trace: {path}")
+    end = len(TRACE_MAGIC) + (len(data) - len(TRACE_MAGIC)) // RECORD.size * RECORD.size
+    for mid, h, ns in RECORD.iter_unpack(memoryview(data)[len(TRACE_MAGIC):end]):
+        if mid < len(METHODS):
+            yield METHODS[mid], h, ns
+
+
+def key_table(service) -> dict[bytes, str]:
+    """
+    Hash -> key for every key the dataset can answer. search_cities matches
+    substrings, so every substring of every city key is included.
+    """
+    table = {key_hash(pc): pc for pc in service.postcode_index}
+    subs = set()
+    for city_key in service.city_index:
+        for i in range(len(city_key)):
+            for j in range(i + 1, len(city_key) + 1):
+                subs.add(city_key[i:j].strip())
+    subs.discard("")
+    for sub in subs:
+        table.setdefault(key_hash(sub), sub)
+    return table
+
+
+def hot_keys(path: str | Path, service, top: int = 200) -> list[tuple[str, str]]:
+    """Most frequent (method, key) pairs of a trace that resolve against `service`."""
+    table = key_table(service)
+    counts = Counter((m, h) for m, h, _ in read_trace(path))
+    out = []
+    for (method, h), _ in counts.most_common():
+        key = table.get(h)
+        if key is not None:
+            out.append((method, key))
+            if len(out) >= top:
+                break
+    return out
+
+
+# ---------------------------
+# Replay
+# ---------------------------
+def _percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def replay(service, path: str | Path, repeat: int = 1) -> dict[str, Any]:
+    """
+    Runs the trace against `service`. Keys that do not resolve match nothing
+    in this dataset, so they are replayed as misses and counted per method
+    under "unresolved".
+    """
+    table = key_table(service)
+    calls = []
+    unresolved: Counter = Counter()
+    for m, h, ns in read_trace(path):
+        key = table.get(h)
+        if key is None:
+            unresolved[m] += 1
+            key = "?" + h.hex()
+        calls.append((getattr(service, m), key, ns))
+
+    timings: list[float] = []
+    perf = time.perf_counter
+    start = perf()
+    for _ in range(repeat):
+        for fn, key, _ in calls:
+            t0 = perf()
+            fn(key)
+            timings.append(perf() - t0)
+    wall = perf() - start
+
+    timings.sort()
+    recorded = sorted(ns / 1000 for _, _, ns in calls)
+    return {
+        "queries": len(timings),
+        "records": len(calls),
+        "resolved": len(calls) - sum(unresolved.values()),
+        "unresolved": dict(unresolved),
+        "wall_s": wall,
+        "qps": len(timings) / wall if wall else 0.0,
+        "p50_us": _percentile(timings, 0.50) * 1e6,
+        "p99_us": _percentile(timings, 0.99) * 1e6,
+        "recorded_p50_us": _percentile(recorded, 0.50),
+        "recorded_p99_us": _percentile(recorded, 0.99),
+    }
+
+
+# ---------------------------
+# CLI
+# ---------------------------
+def _load_service(args):
+    from postcode_service import PostcodeService
+
+    if args.index:
+        return PostcodeService.from_index(args.index)
+    return PostcodeService(args.data, version=args.version)
+
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Replay / inspect PostcodeService query traces.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    for name, help_text in (("replay", "benchmark a build against a trace"),
+                            ("top", "show the most frequent resolved keys")):
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument("trace")
+        p.add_argument("--data", default="data", help="data folder or file (default: data)")
+        p.add_argument("--version", help="pinned snapshot version")
+        p.add_argument("--index", help="prebuilt index to load instead of --data")
+        if name == "replay":
+            p.add_argument("--repeat", type=int, default=1)
+            p.add_argument("--warm-up", action="store_true", help="warm up from the same trace first")
+        else:
+            p.add_argument("-n", type=int, default=20)
+    args = ap.parse_args(argv)
+
+    service = _load_service(args)
+    if args.cmd == "top":
+        for method, key in hot_keys(args.trace, service, top=args.n):
+            print(f"{method:<20}{key}")
+        return 0
+
+    if args.warm_up:
+        service.warm_up(args.trace)
+    stats = replay(service, args.trace, repeat=args.repeat)
+    print(f"queries    {stats['queries']}  ({stats['records']} records, {stats['resolved']} resolved)")
+    if stats["unresolved"]:
+        misses = ", ".join(f"{m} {n}" for m, n in sorted(stats["unresolved"].items()))
+        print(f"unresolved {misses}  (no match in this dataset, replayed as misses)")
+    print(f"wall       {stats['wall_s'] * 1000:.1f} ms  ({stats['qps']:.0f} q/s)")
+    print(f"p50 / p99  {stats['p50_us']:.1f} / {stats['p99_us']:.1f} us")
+    print(f"recorded   {stats['recorded_p50_us']:.1f} / {stats['recorded_p99_us']:.1f} us")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""
+Checks for PostcodeService.with_overrides against the bundled data.
+
+    python -m unittest test_with_overrides
+"""
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from postcode_service import PostcodeService
+
+DATA_PATH = Path(__file__).resolve().parent / "data"
+
+
+class WithOverridesTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.base = PostcodeService(DATA_PATH)
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def overlay(self, overrides: dict) -> PostcodeService:
+        path = Path(self.tmp.name) / "overrides.json"
+        path.write_text(json.dumps(overrides), encoding="utf-8")
+        return self.base.with_overrides(path)
+
+    def assertConsistent(self, service: PostcodeService):
+        """Every listed postcode resolves to a city listing it, and nothing else resolves."""
+        listed: dict[str, set[str]] = {}
+        cities = set()
+        for st in service.states:
+            for c in st["cities"]:
+                cities.add(c["name"].lower())
+                for pc in c["postcodes"]:
+                    listed.setdefault(pc, set()).add(c["name"])
+        self.assertEqual(set(service.postcode_index), set(listed))
+        for pc, names in listed.items():
+            self.assertIn(service.postcode_index[pc]["city"], names, pc)
+        self.assertEqual(set(service.city_index), cities)
+
+    def test_removed_city_keeps_shared_postcodes(self):
+        # 86400 is listed by Batu Pahat and Parit Raja, 84300 by Bukit Pasir and Muar
+        v = self.overlay({"remove": {"cities": ["Parit Raja", "Muar"]}})
+
+        self.assertIsNone(v.lookup_by_city("parit raja"))
+        self.assertIsNone(v.lookup_by_city("muar"))
+        self.assertEqual(v.lookup_by_postcode("86400")["city"], "Batu Pahat")
+        self.assertEqual(v.lookup_by_postcode("84300")["city"], "Bukit Pasir")
+        muar_only = set(self.base.lookup_by_city("muar")["postcodes"]) - {"84300"}
+        self.assertTrue(muar_only)
+        for pc in muar_only:
+            self.assertIsNone(v.lookup_by_postcode(pc), pc)
+        self.assertConsistent(v)
+
+    def test_claimed_postcode_moves(self):
+        v = self.overlay({"states": [{"name": "Johor", "cities": [
+            {"name": "Acme Town", "postcodes": ["40100", "99993"]},
+            {"name": "Batu Pahat", "postcodes": ["99994"]},
+        ]}]})
+
+        self.assertEqual(v.lookup_by_postcode("40100")["city"], "Acme Town")
+        self.assertEqual(v.lookup_by_postcode("40100")["state"], "Johor")
+        self.assertNotIn("40100", v.lookup_by_city("shah alam")["postcodes"])
+        batu_pahat = v.lookup_by_city("batu pahat")["postcodes"]
+        self.assertEqual(set(batu_pahat), set(self.base.lookup_by_city("batu pahat")["postcodes"]) | {"99994"})
+        self.assertConsistent(v)
+
+    def test_base_is_untouched(self):
+        before = dict(self.base.postcode_index)
+        self.overlay({"remove": {"cities": ["Muar"], "postcodes": ["40100"]}})
+        self.assertEqual(dict(self.base.postcode_index), before)
+        self.assertEqual(self.base.lookup_by_postcode("84300")["city"], "Muar")
+
+
+if __name__ == "__main__":
+    unittest.main()